@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta, timezone
+from google.cloud.bigquery_storage_v1 import types
+from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+
+# Columns of the explanation tables and their protobuf wire types.
+# TIMESTAMP columns are sent as int64 microseconds since the Unix epoch; Date_Added is
+# omitted because the staging MERGE fills it in with CURRENT_TIMESTAMP().
+_STRING = descriptor_pb2.FieldDescriptorProto.TYPE_STRING
+_INT64 = descriptor_pb2.FieldDescriptorProto.TYPE_INT64
+ROW_FIELDS = (
+    ("Term", _STRING),
+    ("Simplified_Explanation", _STRING),
+    ("Patient_Friendly_Explanation", _STRING),
+    ("Care_Tips", _STRING),
+    ("Symptoms", _STRING),
+    ("When_To_Consult_Doctor", _STRING),
+    ("Last_Queried", _INT64),
+    ("API_Tokens_Used", _INT64),
+    ("UMLS_Definition", _STRING),
+)
+_FIELD_NAMES = tuple(name for name, _ in ROW_FIELDS)
+_TIMESTAMP_FIELDS = frozenset(("Last_Queried",))
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+def _build_row_descriptor():
+    """
+    Describe one explanation row as a proto2 message, built at import time so no .proto compilation is needed.
+    """
+    file_proto = descriptor_pb2.FileDescriptorProto(name="explanation_row.proto", package="tbird", syntax="proto2")
+    row_proto = file_proto.message_type.add(name="ExplanationRow")
+    for number, (name, field_type) in enumerate(ROW_FIELDS, start=1):
+        row_proto.field.add(
+            name=name,
+            number=number,
+            type=field_type,
+            label=descriptor_pb2.FieldDescriptorProto.LABEL_OPTIONAL
+        )
+
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(file_proto)
+    return row_proto, message_factory.GetMessageClass(pool.FindMessageTypeByName("tbird.ExplanationRow"))
+
+ROW_DESCRIPTOR, ExplanationRow = _build_row_descriptor()
+
+def _to_micros(value):
+    """
+    Convert a timezone-aware datetime to microseconds since the Unix epoch.
+    """
+    return (value - _EPOCH) // _MICROSECOND
+
+def serialize_row(row):
+    """
+    Encode a row dict as a serialized ExplanationRow message.
+    """
+    # Fields are resolved once and set in a single constructor call
+    fields = {name: row[name] for name in _FIELD_NAMES if row.get(name) is not None}
+    for name in _TIMESTAMP_FIELDS & fields.keys():
+        fields[name] = _to_micros(fields[name])
+    return ExplanationRow(**fields).SerializeToString()
+
+def append_rows(write_client, table_path, rows):
+    """
+    Append rows to a table's default stream with the BigQuery Storage Write API.
+    The default stream commits rows immediately with at-least-once semantics.
+    """
+    write_stream = f"{table_path}/streams/_default"
+    proto_rows = types.ProtoRows(serialized_rows=[serialize_row(row) for row in rows])
+    request = types.AppendRowsRequest(
+        write_stream=write_stream,
+        proto_rows=types.AppendRowsRequest.ProtoData(
+            writer_schema=types.ProtoSchema(proto_descriptor=ROW_DESCRIPTOR),
+            rows=proto_rows
+        )
+    )
+
+    # The routing header tells the Storage API which region serves the stream; the
+    # generated client does not derive it from streaming requests on its own
+    metadata = (("x-goog-request-params", f"write_stream={write_stream}"),)
+    for response in write_client.append_rows(iter([request]), metadata=metadata):
+        if response.error.code:
+            raise RuntimeError(f"Storage Write API rejected rows: {response.error.message} {list(response.row_errors)}")
@@ -0,0 +1,36 @@
+from google.cloud import bigquery
+from google.oauth2 import service_account
+from google.auth.transport.requests import AuthorizedSession
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv('key.env')
+
+PROJECT_ID = 'useful-melody-444213-m6'
+
+# Service Account Setup; the key file is parsed once per process and shared by every module
+SERVICE_ACCOUNT_FILE = os.getenv('SERVICE_ACCOUNT_FILE')
+
+# Create credentials for BigQuery
+bq_credentials = service_account.Credentials.from_service_account_file(
+    SERVICE_ACCOUNT_FILE,
+    scopes=["https://www.googleapis.com/auth/bigquery"]
+)
+
+# Pooled, authorized HTTP transport so concurrent BigQuery calls reuse kept-alive connections
+bq_http = AuthorizedSession(bq_credentials)
+bq_http.mount("https://", HTTPAdapter(
+    pool_connections=50,
+    pool_maxsize=100,
+    max_retries=Retry(total=3, backoff_factor=0.2)
+))
+
+# Initialize BigQuery client
+bq_client = bigquery.Client(
+    credentials=bq_credentials,
+    project=PROJECT_ID,
+    _http=bq_http
+)
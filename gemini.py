@@ -1,13 +1,22 @@
 import os
-import requests
-import json
+import logging
+import asyncio
+import aiohttp
+from async_lru import alru_cache
+from cachetools import TTLCache
+import diskcache
+import hashlib
+import math
+import numpy as np
+import orjson
 from dotenv import load_dotenv
 import spacy
-from google.cloud import bigquery
-from google.oauth2 import service_account
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import re
-import json
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv('key.env')
@@ -15,214 +24,530 @@ load_dotenv('key.env')
 # Retrieve API Keys
 UMLS_API_KEY = os.getenv("UMLS_API_KEY")
 
-# Initialize BigQuery Client
-SERVICE_ACCOUNT_FILE = os.getenv('SERVICE_ACCOUNT_FILE')
-bq_credentials = service_account.Credentials.from_service_account_file(
-    SERVICE_ACCOUNT_FILE,
-    scopes=["https://www.googleapis.com/auth/bigquery"]
-)
-
-bq_client = bigquery.Client(
-    credentials=bq_credentials, 
-    project='useful-melody-444213-m6'  # Replace with your project ID
-)
-
-# Load spaCy model (medical model if available)
+# Load spaCy model once per process (medical model if available).
+# Only POS tags and lemmas are used, so the parser and NER are excluded and never even loaded;
+# attribute_ruler stays enabled because it maps tagger output onto token.pos_.
+SPACY_EXCLUDED_PIPES = ["parser", "ner"]
 try:
-    nlp = spacy.load('en_core_sci_md')  # Use SciSpaCy model
+    nlp = spacy.load('en_core_sci_md', exclude=SPACY_EXCLUDED_PIPES)  # Use SciSpaCy model
 except OSError:
-    nlp = spacy.load('en_core_web_sm')  # Fallback to general model
+    nlp = spacy.load('en_core_web_sm', exclude=SPACY_EXCLUDED_PIPES)  # Fallback to general model
 
-def fetch_umls_data(term):
+# The two spaCy callers need different slices of that pipeline: concept extraction runs
+# tok2vec, tagger, attribute_ruler and lemmatizer, while term extraction only reads POS
+# tags and stop words and skips the lemmatizer per call (tok2vec feeds the tagger, so it stays).
+TERM_DISABLED_PIPES = ["lemmatizer"]
+
+# spaCy calls from request handlers run on this pool so they never block the event loop
+nlp_executor = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="nlp")
+
+async def run_nlp(func, *args):
     """
-    Fetch UMLS definitions for a medical term.
+    Run a synchronous spaCy-bound function on the NLP thread pool.
+    """
+    return await asyncio.get_running_loop().run_in_executor(nlp_executor, func, *args)
+
+# Shared HTTP session for UMLS and Gemini, opened on FastAPI startup
+http_session = None
+
+# Connection pool and retry settings for outbound API calls
+POOL_MAX_CONNECTIONS = 64
+POOL_MAX_PER_HOST = 32
+MAX_RETRIES = 2
+RETRY_BACKOFF_SECONDS = 0.2
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+async def open_http_session():
+    """
+    Create the shared aiohttp session used for all outbound API calls.
+    Connections are kept alive and reused across UMLS and Gemini requests.
+    """
+    global http_session
+    if http_session is None or http_session.closed:
+        http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=POOL_MAX_CONNECTIONS, limit_per_host=POOL_MAX_PER_HOST),
+            headers={"Content-Type": "application/json"},
+            json_serialize=lambda body: orjson.dumps(body).decode()
+        )
+    return http_session
+
+async def close_http_session():
+    """
+    Close the shared aiohttp session.
+    """
+    global http_session
+    if http_session is not None:
+        await http_session.close()
+        http_session = None
+
+async def _send_request(method, url, **kwargs):
+    """
+    Send a request on the shared session and return the response once its status is final.
+    Connection errors and transient HTTP statuses are retried with exponential backoff.
+    The caller is responsible for releasing the returned response.
+    """
+    session = await open_http_session()
+    for retry in range(MAX_RETRIES + 1):
+        try:
+            response = await session.request(method, url, **kwargs)
+        except aiohttp.ClientConnectionError:
+            if retry == MAX_RETRIES:
+                raise
+        else:
+            if response.status not in RETRY_STATUSES or retry == MAX_RETRIES:
+                if response.status >= 400:
+                    logger.error("API Error Response: %s", await response.text())
+                    response.release()
+                response.raise_for_status()
+                return response
+            response.release()
+        await asyncio.sleep(RETRY_BACKOFF_SECONDS * 2 ** retry)
+
+async def _request_json(method, url, **kwargs):
+    """
+    Send a request on the shared session and return the decoded JSON body.
+    """
+    response = await _send_request(method, url, **kwargs)
+    async with response:
+        return orjson.loads(await response.read())
+
+# Maximum number of distinct terms kept in the UMLS lookup cache
+UMLS_CACHE_SIZE = 4096
+# UMLS definitions and generated explanations rarely change, so cached entries live for a day
+CACHE_TTL_SECONDS = 24 * 60 * 60
+
+@alru_cache(maxsize=UMLS_CACHE_SIZE, ttl=CACHE_TTL_SECONDS)
+async def _fetch_umls_cached(term):
+    """
+    Look up the CUI and definitions for a normalized term.
+    Errors propagate so that failed lookups are never cached.
     """
     search_url = "https://uts-ws.nlm.nih.gov/rest/search/current"
     params = {"string": term, "apiKey": UMLS_API_KEY}
 
-    try:
-        search_response = requests.get(search_url, params=params)
-        search_response.raise_for_status()
-        results = search_response.json().get("result", {}).get("results", [])
+    search_json = await _request_json("GET", search_url, params=params)
+    results = search_json.get("result", {}).get("results", [])
 
-        if not results:
-            return {"term": term, "definitions": []}
+    if not results:
+        return {"definitions": []}
 
-        # Retrieve first CUI and fetch definitions
-        cui = results[0]['ui']
-        def_url = f"https://uts-ws.nlm.nih.gov/rest/content/current/CUI/{cui}/definitions"
-        def_response = requests.get(def_url, params={"apiKey": UMLS_API_KEY})
-        def_response.raise_for_status()
+    # Retrieve first CUI and fetch definitions
+    cui = results[0]['ui']
+    def_url = f"https://uts-ws.nlm.nih.gov/rest/content/current/CUI/{cui}/definitions"
+    def_json = await _request_json("GET", def_url, params={"apiKey": UMLS_API_KEY})
 
-        definitions = [d['value'] for d in def_response.json().get("result", [])]
-        return {"term": term, "cui": cui, "definitions": definitions}
+    definitions = [d['value'] for d in def_json.get("result", [])]
+    return {"cui": cui, "definitions": definitions}
+
+async def fetch_umls_data(term):
+    """
+    Fetch UMLS definitions for a medical term.
+    Results are cached per normalized term, so repeated terms skip the network.
+    """
+    try:
+        umls_data = await _fetch_umls_cached(term.strip().lower())
+        return {"term": term, **umls_data}
 
     except Exception as e:
-        print(f"UMLS API Error: {e}")
+        logger.error("UMLS API Error: %s", e)
         return {"term": term, "definitions": []}
 
+# Coarse POS tags treated as key concepts
+NOUN_POS = frozenset(("NOUN", "PROPN"))
+
+# Maximum number of distinct texts (in practice UMLS definitions) whose concept sets are cached
+CONCEPT_CACHE_SIZE = 4096
+
+@lru_cache(maxsize=CONCEPT_CACHE_SIZE)
 def extract_key_concepts(text):
     """
     Extract key concepts from text using spaCy.
+    Results are cached, since the same UMLS definition is validated against many responses.
     """
     if not text:
-        return []
+        return frozenset()
     doc = nlp(text)
-    return list(set(token.lemma_.lower() for token in doc if token.pos_ in ["NOUN", "PROPN"] and len(token.text) > 2))
+    return frozenset(token.lemma_.lower() for token in doc if token.pos_ in NOUN_POS and len(token.text) > 2)
     
+# Minimum share of UMLS concepts a Gemini response must cover to be accepted
+COVERAGE_THRESHOLD = 0.4
+
 #to check how much of the UMLS clinically accurate definition's content is reflected in Gemini's structured output
-def validate_response_coverage(umls_definition, gemini_response, threshold=0.4):
+def validate_response_coverage(umls_definition, gemini_response, threshold=COVERAGE_THRESHOLD, umls_concepts=None):
     """
     Validate that Gemini's response aligns with UMLS concepts.
+    Pass umls_concepts when the definition's concepts were already extracted.
     """
     if not umls_definition:
-        print("UMLS Definition is empty.")
+        logger.debug("UMLS Definition is empty. cache_candidate=True")
         return 1.0  # If no UMLS definition, assume full coverage.
 
-    umls_concepts = extract_key_concepts(umls_definition)
-    response_text = ' '.join([
+    if umls_concepts is None:
+        umls_concepts = extract_key_concepts(umls_definition)
+    logger.debug("UMLS Concepts: %s", umls_concepts)
+    if not umls_concepts:
+        logger.debug("Concept Coverage: %.2f%%", 0.0)
+        return 0.0
+
+    # Sections are piped lazily, one at a time, so the rest of the response is never
+    # tokenized once enough UMLS concepts have matched; the coverage is then a lower bound
+    section_texts = (
         gemini_response.get('simple_explanation', ''),
-        ' '.join(gemini_response.get('signs_to_notice', [])),
-        ' '.join(gemini_response.get('care_advice', [])),
+        *gemini_response.get('signs_to_notice', ()),
+        *gemini_response.get('care_advice', ()),
         gemini_response.get('doctor_consultation_advice', '')
-    ])
-    response_concepts = extract_key_concepts(response_text)
-
-    print(f"UMLS Concepts: {umls_concepts}")
-    print(f"Response Concepts: {response_concepts}")
-
-    matching_concepts = set(umls_concepts) & set(response_concepts)
-    coverage = len(matching_concepts) / len(umls_concepts) if umls_concepts else 0.0
-
-    print(f"Matching Concepts: {matching_concepts}")
-    print(f"Concept Coverage: {coverage * 100:.2f}%")
+    )
+    needed = math.ceil(threshold * len(umls_concepts))
+    matching_concepts = set()
+    for doc in nlp.pipe(section_texts, batch_size=1):
+        for token in doc:
+            if token.pos_ in NOUN_POS and len(token.text) > 2:
+                lemma = token.lemma_.lower()
+                if lemma in umls_concepts:
+                    matching_concepts.add(lemma)
+        if len(matching_concepts) >= needed:
+            break
+
+    coverage = len(matching_concepts) / len(umls_concepts)
+
+    logger.debug("Matching Concepts: %s", matching_concepts)
+    logger.debug("Concept Coverage: %.2f%%", coverage * 100)
     return coverage
 
-def parse_gemini_response(response_text):
+# Section headers in Gemini's structured output, compiled once and matched with a single scan per line
+_HEADER_RE = re.compile(r"^(SIMPLE EXPLANATION|SIGNS TO NOTICE|CARE ADVICE|DOCTOR CONSULTATION)[:\s]*(.*)", re.IGNORECASE)
+# "•" is always a bullet; "-" and "*" only when followed by whitespace, so markdown
+# such as "**Note:**" or "---" rules is not mistaken for a list item
+_BULLET_MARKER = "•"
+_SPACED_BULLET_MARKERS = ("-", "*")
+_SECTION_MAP = {
+    'SIMPLE EXPLANATION': 'simple_explanation',
+    'SIGNS TO NOTICE': 'signs_to_notice',
+    'CARE ADVICE': 'care_advice',
+    'DOCTOR CONSULTATION': 'doctor_consultation_advice'
+}
+_LIST_SECTIONS = frozenset(('signs_to_notice', 'care_advice'))
+
+def _new_sections():
     """
-    Parse Gemini's response into structured format with improved flexibility.
+    Return an empty structured response.
+    The simple explanation collects line fragments until _finish_sections joins them.
     """
-    print("Raw Response Text:", response_text)  # Debug print
-
-    # Clean and standardize the response text
-    lines = response_text.strip().split("\n")
-    sections = {
-        'simple_explanation': '',
+    return {
+        'simple_explanation': [],
         'signs_to_notice': [],
         'care_advice': [],
         'doctor_consultation_advice': ''
     }
 
+def _parse_line(sections, current_section, line):
+    """
+    Apply one line of Gemini output to the parsed sections and return the active section.
+    """
+    line = line.strip()
+
+    # Match headers regardless of formatting
+    header = _HEADER_RE.match(line)
+    if header:
+        current_section = _SECTION_MAP[header.group(1).upper()]
+        text = header.group(2).strip()
+        if current_section == 'simple_explanation':
+            sections[current_section] = [text] if text else []
+        elif current_section == 'doctor_consultation_advice':
+            sections[current_section] = text
+        return current_section
+
+    # Append bullet points or relevant lines to current section
+    if current_section in _LIST_SECTIONS:
+        if line.startswith(_BULLET_MARKER) or (line.startswith(_SPACED_BULLET_MARKERS) and line[1:2].isspace()):
+            sections[current_section].append(line[1:].strip())
+    elif current_section == 'simple_explanation' and line and not line.startswith("**"):
+        sections['simple_explanation'].append(line)
+    return current_section
+
+def _finish_sections(sections):
+    """
+    Join the collected simple explanation fragments into a single string.
+    """
+    sections['simple_explanation'] = " ".join(sections['simple_explanation'])
+    return sections
+
+def parse_gemini_response(response_text):
+    """
+    Parse Gemini's response into structured format with improved flexibility.
+    """
+    logger.debug("Raw Response Text: %s", response_text)
+
+    # Clean and standardize the response text
+    sections = _new_sections()
     current_section = None
+    for line in response_text.strip().split("\n"):
+        current_section = _parse_line(sections, current_section, line)
+    _finish_sections(sections)
 
-    for line in lines:
-        line = line.strip()
-
-        # Match headers regardless of formatting
-        if re.match(r"^SIMPLE EXPLANATION[:\s]*", line, re.IGNORECASE):
-            current_section = 'simple_explanation'
-            sections[current_section] = re.sub(r"^SIMPLE EXPLANATION[:\s]*", "", line, flags=re.IGNORECASE).strip()
-        elif re.match(r"^SIGNS TO NOTICE[:\s]*", line, re.IGNORECASE):
-            current_section = 'signs_to_notice'
-        elif re.match(r"^CARE ADVICE[:\s]*", line, re.IGNORECASE):
-            current_section = 'care_advice'
-        elif re.match(r"^DOCTOR CONSULTATION[:\s]*", line, re.IGNORECASE):
-            current_section = 'doctor_consultation_advice'
-            sections[current_section] = re.sub(r"^DOCTOR CONSULTATION[:\s]*", "", line, flags=re.IGNORECASE).strip()
-
-        # Append bullet points or relevant lines to current section
-        elif current_section == 'signs_to_notice' and line.startswith("•"):
-            sections['signs_to_notice'].append(line.replace("•", "").strip())
-        elif current_section == 'care_advice' and line.startswith("•"):
-            sections['care_advice'].append(line.replace("•", "").strip())
-        elif current_section == 'simple_explanation' and current_section and not line.startswith("**"):
-            sections['simple_explanation'] += " " + line.strip()
-
-    print("Parsed Sections:", sections)  # Debug print
+    logger.debug("Parsed Sections: %s", sections)
     return sections
+
+async def stream_gemini_response(prompt, usage_metadata=None):
+    """
+    Stream a Gemini generation and parse sections as lines arrive.
+    The stream is closed as soon as every section is populated, so trailing output is never waited for.
+    Returns the raw response text, the parsed sections and the latest usage metadata.
+    A usage_metadata dict passed in is updated as usage arrives, so it stays readable if the stream is cancelled.
+    """
+    response = await _send_request(
+        "POST",
+        "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash-latest:streamGenerateContent",
+        params={"key": os.getenv('GEMINI_API_KEY'), "alt": "sse"},
+        json={"contents": [{"parts": [{"text": prompt}]}]}
+    )
+
+    text_parts = []
+    pending = ''
+    sections = _new_sections()
+    current_section = None
+    if usage_metadata is None:
+        usage_metadata = {}
+    async with response:
+        # Each server-sent event carries a partial GenerateContentResponse
+        async for event in response.content:
+            if not event.startswith(b"data:"):
+                continue
+            chunk = orjson.loads(event[5:])
+            usage_metadata.update(chunk.get('usageMetadata', ()))
+            for candidate in chunk.get('candidates', [])[:1]:
+                for part in candidate.get('content', {}).get('parts', []):
+                    text_parts.append(part.get('text', ''))
+                    pending += part.get('text', '')
+
+            *lines, pending = pending.split("\n")
+            for line in lines:
+                current_section = _parse_line(sections, current_section, line)
+            if lines and all(sections.values()):
+                response.close()
+                break
+        else:
+            current_section = _parse_line(sections, current_section, pending)
+
+    return ''.join(text_parts), _finish_sections(sections), usage_metadata
       
-def query_gemini(term, simplified_explanation, max_attempts=3):
+# Gemini response cache: exact matches on (term, UMLS definition) plus a semantic tier on term vectors
+GEMINI_CACHE_SIZE = 2048
+SEMANTIC_SIMILARITY_THRESHOLD = 0.95
+GEMINI_CACHE_DIR = os.getenv('GEMINI_CACHE_DIR')  # Set to persist cached responses across restarts
+
+if GEMINI_CACHE_DIR:
+    gemini_cache = diskcache.Cache(GEMINI_CACHE_DIR, eviction_policy='least-recently-used')
+else:
+    gemini_cache = TTLCache(maxsize=GEMINI_CACHE_SIZE, ttl=CACHE_TTL_SECONDS)
+
+# In-flight generations per cache key, so concurrent requests for one term share a single Gemini call
+_gemini_inflight = {}
+
+# Maximum number of Gemini generations streaming at once across all requests, to stay within the rate limit
+GEMINI_MAX_CONCURRENCY = 32
+gemini_semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+
+# Semantic tier; only used when the spaCy model ships word vectors.
+# Unit-length term vectors live in a preallocated ring buffer; _semantic_rows maps each cache key
+# to its row and _semantic_keys holds the key stored in each row, so the oldest row is overwritten
+_semantic_matrix = np.zeros((GEMINI_CACHE_SIZE, nlp.vocab.vectors_length), dtype=np.float32)
+_semantic_keys = [None] * GEMINI_CACHE_SIZE
+_semantic_rows = {}
+_semantic_next_row = 0
+
+def _gemini_cache_key(term, umls_definition):
+    """
+    Build the exact-match cache key for a term and its UMLS definition.
+    """
+    return hashlib.sha256(f"{term.strip().lower()}\x00{umls_definition}".encode('utf-8')).hexdigest()
+
+def _term_vector(term):
+    """
+    Return the normalized word vector for a term, or None if unavailable.
+    """
+    if not nlp.vocab.vectors_length:
+        return None
+    vector = nlp.make_doc(term).vector
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else None
+
+def _get_cached_response(term, umls_definition, cache_key):
+    """
+    Look up a previously validated Gemini response, first by exact key, then by term similarity.
+    Similar terms only share a response when both resolved to the same UMLS definition.
+    """
+    cached = gemini_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Without a definition there is nothing to tell e.g. "type 1 diabetes" from "type 2 diabetes"
+    if not umls_definition:
+        return None
+
+    vector = _term_vector(term)
+    if vector is None or not _semantic_rows:
+        return None
+
+    # Rows fill in order and are only overwritten once all are used, so the filled rows are a prefix
+    similarities = _semantic_matrix[:len(_semantic_rows)] @ vector
+    best = int(np.argmax(similarities))
+    if similarities[best] < SEMANTIC_SIMILARITY_THRESHOLD:
+        return None
+
+    cached = gemini_cache.get(_semantic_keys[best])
+    if cached is None or cached.get('umls_definition') != umls_definition:
+        return None
+    logger.debug("Semantic cache hit for '%s' (similarity %.3f)", term, similarities[best])
+    return cached
+
+def _cache_response(term, cache_key, result):
+    """
+    Store a validated Gemini response in both cache tiers.
+    """
+    if GEMINI_CACHE_DIR:
+        gemini_cache.set(cache_key, result, expire=CACHE_TTL_SECONDS)
+    else:
+        gemini_cache[cache_key] = result
+
+    global _semantic_next_row
+    vector = _term_vector(term)
+    if vector is None or cache_key in _semantic_rows:
+        return
+
+    row = _semantic_next_row
+    evicted_key = _semantic_keys[row]
+    if evicted_key is not None:
+        del _semantic_rows[evicted_key]
+    _semantic_matrix[row] = vector
+    _semantic_keys[row] = cache_key
+    _semantic_rows[cache_key] = row
+    _semantic_next_row = (row + 1) % GEMINI_CACHE_SIZE
+
+async def _gemini_attempt(term, prompt, umls_definition, umls_concepts_task, usage_metadata, attempt):
+    """
+    Run one Gemini generation and return the result if it passes coverage validation.
+    The attempt's token usage is recorded in usage_metadata, whether or not it succeeds.
+    """
+    try:
+        # Generate and parse the response as it streams in, counting against the shared Gemini limit
+        async with gemini_semaphore:
+            gemini_response_text, parsed_response, _ = await stream_gemini_response(prompt, usage_metadata)
+        umls_concepts = await umls_concepts_task
+        logger.debug("Raw Gemini Response: %s", gemini_response_text)
+        logger.debug("Parsed Response: %s", parsed_response)
+
+        # Validate response coverage
+        coverage = await run_nlp(validate_response_coverage, umls_definition, parsed_response, COVERAGE_THRESHOLD, umls_concepts)
+        if coverage >= COVERAGE_THRESHOLD:
+            return {
+                "term": term,
+                "medical_details": parsed_response,
+                "umls_definition": umls_definition
+            }
+        logger.info("Response coverage validation failed (%.2f%% < %.0f%%)", coverage * 100, COVERAGE_THRESHOLD * 100)
+
+    except Exception as e:
+        logger.error("Gemini API Error on attempt %d: %s", attempt + 1, e)
+
+    return None
+
+async def _generate_validated(term, prompt, umls_definition, cache_key, max_attempts):
+    """
+    Run Gemini attempts concurrently and cache the first response that passes validation.
+    Returns the result (None if every attempt fails) and the tokens used by all attempts.
+    """
+    # The UMLS definition's concepts are extracted on the NLP pool while the attempts stream
+    umls_concepts_task = asyncio.create_task(run_nlp(extract_key_concepts, umls_definition))
+
+    # The first response that passes validation is returned and the rest are cancelled
+    usages = [{} for _ in range(max_attempts)]
+    tasks = [
+        asyncio.create_task(_gemini_attempt(term, prompt, umls_definition, umls_concepts_task, usages[attempt], attempt))
+        for attempt in range(max_attempts)
+    ]
+    result = None
+    try:
+        for next_attempt in asyncio.as_completed(tasks):
+            result = await next_attempt
+            if result is not None:
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+        umls_concepts_task.cancel()
+
+    # Every attempt is billed, including the ones cancelled above (up to the last usage they
+    # received), so the explanation's cost is the combined usage of all attempts
+    total_tokens = sum(usage.get('totalTokenCount', 0) for usage in usages)
+    if result is None:
+        logger.info("All %d Gemini attempts failed validation (%d tokens used)", max_attempts, total_tokens)
+        return None, total_tokens
+
+    result["total_tokens"] = total_tokens
+    _cache_response(term, cache_key, result)
+    return result, total_tokens
+
+async def query_gemini(term, simplified_explanation='', umls_definition=None, max_attempts=3):
     """
     Generate validated medical explanations using Gemini API.
+    Pass umls_definition when the caller has already fetched it to skip the UMLS lookup.
     """
     # Fetch UMLS data
-    umls_data = fetch_umls_data(term)
-    umls_definition = umls_data['definitions'][0] if umls_data['definitions'] else ''
+    if umls_definition is None:
+        umls_data = await fetch_umls_data(term)
+        umls_definition = (umls_data.get('definitions') or [''])[0]
+
+    # Serve repeated (or near-identical) terms from the cache without calling Gemini.
+    # total_tokens stays the cost of generating the cached explanation, so the stored
+    # API_Tokens_Used is not overwritten with 0 on repeat queries; cached=True marks that
+    # this call itself spent no tokens
+    cache_key = _gemini_cache_key(term, umls_definition)
+    cached = _get_cached_response(term, umls_definition, cache_key)
+    if cached is not None:
+        return {**cached, "term": term, "cached": True}
+
+    # Craft prompt for Gemini
+    prompt = f"""
+    Medical Term: {term}
+    UMLS Definition: {umls_definition}
+    Simplified Explanation: {simplified_explanation}
+
+    Generate a structured response with the following sections:
+
+    SIMPLE EXPLANATION: [One clear, non-technical sentence about the medical term]
+    SIGNS TO NOTICE:
+    • [First sign to look out for]
+    • [Second sign to notice]
+    • [Third sign to be aware of]
+    CARE ADVICE:
+    • [First practical care tip]
+    • [Second helpful care suggestion]
+    • [Third self-care recommendation]
+    DOCTOR CONSULTATION: [One sentence advising when to seek medical help]
+
+    Ensure clinical accuracy and integrate UMLS concepts.
+    """
 
-    #If coverage is satisfactory and matches UMLS definition the response is returned; otherwise, the loop tries to regenerate it
-    for attempt in range(max_attempts):
-        try:
-            # Craft prompt for Gemini
-            prompt = f"""
-            Medical Term: {term}
-            UMLS Definition: {umls_definition}
-            Simplified Explanation: {simplified_explanation}
-
-            Generate a structured response with the following sections:
-
-            SIMPLE EXPLANATION: [One clear, non-technical sentence about the medical term]
-            SIGNS TO NOTICE:
-            • [First sign to look out for]
-            • [Second sign to notice]
-            • [Third sign to be aware of]
-            CARE ADVICE:
-            • [First practical care tip]
-            • [Second helpful care suggestion]
-            • [Third self-care recommendation]
-            DOCTOR CONSULTATION: [One sentence advising when to seek medical help]
-
-            Ensure clinical accuracy and integrate UMLS concepts.
-            """
-
-            # Generate response
-            response = requests.post(
-                "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash-latest:generateContent",
-                params={"key": os.getenv('GEMINI_API_KEY')},
-                headers={"Content-Type": "application/json"},
-                json={"contents": [{"parts": [{"text": prompt}]}]}
-            )
-            response.raise_for_status()
-
-            # Extract text from response
-            gemini_response_text = response.json()['candidates'][0]['content']['parts'][0]['text']
-            print("Raw Gemini Response:", gemini_response_text)  # Debug print
-
-            # Parse response
-            parsed_response = parse_gemini_response(gemini_response_text)
-            print("Parsed Response:", parsed_response)  # Debug print
-            # After generating the response
-            print("Raw Gemini Response Text:", gemini_response_text)
-            print("Response JSON:", response.json())
-            # Calculate tokens
-            total_tokens = len(prompt.split())
-            response_tokens = len(gemini_response_text.split())
-            api_tokens_used = total_tokens + response_tokens
-
-            # Validate response coverage
-            if validate_response_coverage(umls_definition, parsed_response):
-                return {
-                    "term": term,
-                    "medical_details": parsed_response,
-                    "umls_definition": umls_definition,
-                    "total_tokens": api_tokens_used
-                }
-            else:
-                print("Response coverage validation failed")
-
-        except Exception as e:
-            print(f"Gemini API Error on attempt {attempt + 1}: {e}")
-            # If possible, print out the full response to see what's happening
-            try:
-                print("Full API Response:", response.json())
-            except:
-                pass
-
-    # If all attempts fail
+    # Join an identical generation that is already running instead of starting another one
+    generation = _gemini_inflight.get(cache_key)
+    joined = generation is not None
+    if not joined:
+        generation = asyncio.create_task(_generate_validated(term, prompt, umls_definition, cache_key, max_attempts))
+        _gemini_inflight[cache_key] = generation
+        generation.add_done_callback(lambda _: _gemini_inflight.pop(cache_key, None))
+    result, total_tokens = await asyncio.shield(generation)
+    if result is not None:
+        return {**result, "term": term, "cached": True} if joined else result
+
+    # If all attempts fail; the failed attempts were still billed
     return {
         "term": term,
         "medical_details": {
             "simple_explanation": f"Could not generate an explanation for {term}",
         },
         "error": "Could not generate an accurate medical explanation",
-        "fallback_explanation": simplified_explanation
+        "fallback_explanation": simplified_explanation,
+        "total_tokens": total_tokens,
+        "cached": joined
     }
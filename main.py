@@ -1,68 +1,260 @@
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from google.cloud import bigquery
-from google.oauth2 import service_account
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, Field
+from google.cloud import bigquery_storage_v1
+from google.api_core.exceptions import NotFound
 import os
+import re
+import logging
+import asyncio
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from functools import lru_cache
+from types import MappingProxyType
 import time
-from gemini import query_gemini, validate_response_coverage, fetch_umls_data 
-import spacy
+from spacy.matcher import Matcher
+from gcp_clients import PROJECT_ID, bq_credentials, bq_client
+from bq_storage import append_rows
+from merge_staging import ensure_staging_table, submit_staging_merge, JOB_LABELS
+from gemini import query_gemini, validate_response_coverage, fetch_umls_data, open_http_session, close_http_session, nlp, run_nlp, NOUN_POS, TERM_DISABLED_PIPES
 
 # Load environment variables
 load_dotenv('key.env')
 
-# Initialize FastAPI app
-app = FastAPI()
+# Debug output (raw Gemini responses, concept sets) is only formatted when LOG_LEVEL=DEBUG
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'))
+logger = logging.getLogger(__name__)
 
-# Service Account Setup
-SERVICE_ACCOUNT_FILE = os.getenv('SERVICE_ACCOUNT_FILE')
+# Initialize FastAPI app, serializing responses with orjson
+app = FastAPI(default_response_class=ORJSONResponse)
 
-# Create credentials for BigQuery
-bq_credentials = service_account.Credentials.from_service_account_file(
-    SERVICE_ACCOUNT_FILE,
-    scopes=["https://www.googleapis.com/auth/bigquery"]
-)
+# Initialize BigQuery Storage Write API client with the shared credentials from gcp_clients.py
+bq_write_client = bigquery_storage_v1.BigQueryWriteClient(credentials=bq_credentials)
 
-# Initialize BigQuery client
-bq_client = bigquery.Client(
-    credentials=bq_credentials, 
-    project='useful-melody-444213-m6'  
-)
+# Explanations are streamed into a staging table and periodically
+# deduplicated into the main dbtable (see merge_staging.py)
+STAGING_TABLE_PATH = bq_write_client.table_path(PROJECT_ID, 'tbird_resources', 'dbtable_stage')
 
-def extract_medical_term(input_text):
+# Queued rows are appended in one request once this many arrive or the interval elapses
+BQ_FLUSH_MAX_ROWS = 500  # BigQuery recommends ~500 rows per streaming insert request
+BQ_FLUSH_INTERVAL_SECONDS = 2.0
+
+# Interval of the in-process staging -> dbtable MERGE; set to 0 when it runs from Cloud Scheduler instead
+STAGING_MERGE_INTERVAL_SECONDS = float(os.getenv('STAGING_MERGE_INTERVAL_SECONDS', 60))
+# Each merge rescans staged rows this far back before the previous merge started, to cover late appends
+STAGING_MERGE_LOOKBACK = timedelta(minutes=10)
+
+def insert_rows(rows):
     """
-    Extract the medical term from a given input text using spaCy.
+    Append a batch of explanation rows to the staging table as protobuf rows.
     """
-    try:
+    append_rows(bq_write_client, STAGING_TABLE_PATH, rows)
+
+async def _bq_flusher(queue):
+    """
+    Drain queued rows in batches and stream each batch into the staging table.
+    A None item flushes the current batch and stops the flusher.
+    """
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+        row = await queue.get()
+        if row is None:
+            break
+        batch = [row]
+        deadline = loop.time() + BQ_FLUSH_INTERVAL_SECONDS
+        while len(batch) < BQ_FLUSH_MAX_ROWS:
+            try:
+                row = await asyncio.wait_for(queue.get(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                break
+            if row is None:
+                stopping = True
+                break
+            batch.append(row)
+
         try:
-            nlp = spacy.load('en_core_sci_md')  # Medical model
-        except OSError:
-            nlp = spacy.load('en_core_web_sm')  # Fallback to general model
+            await asyncio.to_thread(insert_rows, batch)
+        except Exception as db_error:
+            # Log the error but keep the flusher running
+            logger.error("Database upsert error for %d rows: %s", len(batch), db_error)
 
-        # Process the text
-        doc = nlp(input_text)
-        
-        # Strategy 1: Look for proper nouns or nouns that might represent medical conditions
-        medical_terms = [
-            token.text for token in doc 
-            if token.pos_ in ['PROPN', 'NOUN'] and len(token.text) > 2
-        ]
-        
-        # Strategy 2: If no medical terms found, fall back to the longest meaningful word
-        if not medical_terms:
-            medical_terms = [
-                token.text for token in doc 
-                if len(token.text) > 3 and not token.is_stop
-            ]
-        
-        # Return the most likely medical term (first in the list)
-        return medical_terms[0] if medical_terms else input_text
+async def _staging_merger():
+    """
+    Periodically merge recently staged rows into the main table.
+    Each MERGE job is submitted without waiting for it and reaped on the next tick.
+    """
+    since = None
+    job = None
+    job_started_at = None
+    while True:
+        await asyncio.sleep(STAGING_MERGE_INTERVAL_SECONDS)
+        try:
+            if job is not None:
+                # Leave a still-running MERGE alone and check on it again next tick
+                if not await asyncio.to_thread(job.done):
+                    continue
+                if job.error_result:
+                    # Keep the previous cursor so the next run retries the same rows
+                    logger.error("Staging merge job %s failed: %s", job.job_id, job.error_result)
+                else:
+                    logger.info("Merged staged rows into the main table (%s rows affected)", job.num_dml_affected_rows)
+                    since = job_started_at - STAGING_MERGE_LOOKBACK
+                job = None
+
+            started_at = datetime.now(timezone.utc)
+            job = await asyncio.to_thread(submit_staging_merge, bq_client, since)
+            job_started_at = started_at
+            app.state.merge_job_id = job.job_id
+            logger.debug("Submitted staging merge job %s", job.job_id)
+        except Exception as db_error:
+            logger.error("Staging merge error: %s", db_error)
+
+@app.on_event("startup")
+async def startup():
+    """
+    Open the shared HTTP session used for UMLS and Gemini calls and start the BigQuery background tasks.
+    """
+    await open_http_session()
+    await asyncio.to_thread(ensure_staging_table, bq_client)
+    app.state.bq_queue = asyncio.Queue()
+    app.state.bq_task = asyncio.create_task(_bq_flusher(app.state.bq_queue))
+    app.state.merge_task = None
+    app.state.merge_job_id = None
+    if STAGING_MERGE_INTERVAL_SECONDS > 0:
+        app.state.merge_task = asyncio.create_task(_staging_merger())
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    Flush queued BigQuery rows and close the shared HTTP session.
+    """
+    await app.state.bq_queue.put(None)
+    await app.state.bq_task
+    if app.state.merge_task is not None:
+        app.state.merge_task.cancel()
+    await close_http_session()
+
+# Short inputs (at most this many words) are resolved with a regex instead of spaCy
+FAST_PATH_MAX_WORDS = 3
+_FAST_TOKEN_RE = re.compile(r"[A-Za-z][A-Za-z0-9\-]{2,}")
+# spaCy's English stop words (a plain set on the language defaults, no pipeline run needed)
+# plus the question words users wrap terms in
+_STOP_WORDS = frozenset(nlp.Defaults.stop_words) | frozenset({
+    "whats", "mean", "means", "meaning", "define", "explain", "tell"
+})
+
+# Inputs that already look like a bare term (letters, hyphens and spaces, at most this many
+# words, no stop words) are passed through unchanged, e.g. "Myocardial infarction";
+# phrasing such as "I have asthma" or "pain in my knee" still goes through extraction
+CLEAN_TERM_MAX_WORDS = 4
+_CLEAN_TERM_RE = re.compile(r"^[A-Za-z][A-Za-z\-\s]{2,60}$")
+
+def _is_clean_term(input_text):
+    """
+    Check whether stripped input text is already a bare medical term.
+    """
+    words = input_text.split()
+    return (
+        len(words) <= CLEAN_TERM_MAX_WORDS
+        and _CLEAN_TERM_RE.match(input_text) is not None
+        and not any(word.lower() in _STOP_WORDS for word in words)
+    )
+
+def _resolves_without_spacy(input_text):
+    """
+    Check whether stripped input text is handled by a fast path that never reaches spaCy.
+    """
+    return len(input_text.split()) <= FAST_PATH_MAX_WORDS or _is_clean_term(input_text)
+
+# Token patterns for term extraction, matched in spaCy's Cython loop rather than per token in Python
+term_matcher = Matcher(nlp.vocab)
+term_matcher.add("NOUN_TERM", [[{"POS": {"IN": sorted(NOUN_POS)}, "IS_STOP": False, "LENGTH": {">=": 3}}]])
+term_matcher.add("FALLBACK_TERM", [[{"IS_STOP": False, "LENGTH": {">=": 4}}]])
+_NOUN_TERM = nlp.vocab.strings["NOUN_TERM"]
+_FALLBACK_TERM = nlp.vocab.strings["FALLBACK_TERM"]
+
+async def extract_medical_term(input_text):
+    """
+    Extract the medical term from a given input text using spaCy.
+    Inputs that need the spaCy pipeline are processed on the NLP thread pool.
+    """
+    input_text = input_text.strip()
+    # Short and clean inputs never reach spaCy, so they are resolved inline without a thread hop
+    if _resolves_without_spacy(input_text):
+        return _extract_medical_term(input_text)
+    return await run_nlp(_extract_medical_term, input_text)
+
+@lru_cache(maxsize=8192)
+def _extract_medical_term(input_text):
+    """
+    Cached term extraction for stripped input text.
+    """
+    # Single words are already the term; skip spaCy entirely
+    if " " not in input_text:
+        return input_text
+
+    # Clean multi-word terms are kept whole rather than cut down to one word
+    if _is_clean_term(input_text):
+        return input_text
+
+    # Short inputs: take the first word that is not a stop word, still without spaCy
+    if len(input_text.split()) <= FAST_PATH_MAX_WORDS:
+        return next(
+            (word for word in _FAST_TOKEN_RE.findall(input_text) if word.lower() not in _STOP_WORDS),
+            input_text
+        )
+
+    try:
+        # Process the text with the shared model loaded in gemini.py, minus the lemmatizer
+        doc = nlp(input_text, disable=TERM_DISABLED_PIPES)
+        return _term_from_doc(doc, input_text)
 
     except Exception as e:
-        print(f"Error extracting medical term: {e}")
+        logger.error("Error extracting medical term: %s", e)
         return input_text
 
+def _term_from_doc(doc, input_text):
+    """
+    Pick the medical term from a processed doc using the precompiled term matcher.
+    """
+    matches = term_matcher(doc)
+
+    # Strategy 1: Proper nouns or nouns that might represent medical conditions
+    # Strategy 2: If no medical terms found, fall back to the first meaningful word
+    for label in (_NOUN_TERM, _FALLBACK_TERM):
+        for match_id, start, end in matches:
+            if match_id == label:
+                return doc[start:end].text
+    return input_text
+
+# Batch endpoint inputs that need spaCy are piped through it together in batches of this size
+TERM_PIPE_BATCH_SIZE = 64
+
+async def extract_medical_terms(input_texts):
+    """
+    Extract the medical terms for a batch of inputs.
+    Inputs that need spaCy are processed together in a single nlp.pipe call on the NLP thread pool.
+    """
+    input_texts = [input_text.strip() for input_text in input_texts]
+    # Unique inputs that need spaCy, in order; the rest go through the cached fast paths
+    long_texts = list(dict.fromkeys(text for text in input_texts if not _resolves_without_spacy(text)))
+    long_terms = dict(zip(long_texts, await run_nlp(_pipe_medical_terms, long_texts))) if long_texts else {}
+    return [long_terms.get(text) or _extract_medical_term(text) for text in input_texts]
+
+def _pipe_medical_terms(input_texts):
+    """
+    Extract the medical term from each input text with one spaCy pipe call.
+    """
+    try:
+        docs = nlp.pipe(input_texts, batch_size=TERM_PIPE_BATCH_SIZE, disable=TERM_DISABLED_PIPES)
+        return [_term_from_doc(doc, input_text) for doc, input_text in zip(docs, input_texts)]
+
+    except Exception as e:
+        logger.error("Error extracting medical terms: %s", e)
+        return list(input_texts)
+
 # Pydantic model for input validation
 
 class MedicalTermInput(BaseModel):
@@ -70,163 +262,192 @@ class MedicalTermInput(BaseModel):
     simplified_explanation: Optional[str] = None
     additional_details: Optional[dict] = None
 
-@app.get("/medical-explanation")
-def get_medical_explanation(term: str):
+# Maximum number of terms accepted in one batch request
+MAX_BATCH_TERMS = 100
+
+class BatchTermInput(BaseModel):
+    terms: List[str] = Field(..., max_length=MAX_BATCH_TERMS)
+
+# Maximum length of text columns written to BigQuery
+MAX_FIELD_LENGTH = 500
+
+def _clip(value, limit=MAX_FIELD_LENGTH):
     """
-    Endpoint for generating user-friendly medical explanations.
-    Always generates a Gemini response and updates the database.
+    Truncate a value to the column length, skipping the copy when it already fits.
+    """
+    if isinstance(value, str) and len(value) <= limit:
+        return value
+    return str(value)[:limit]
+
+def _join_clip(items, limit=MAX_FIELD_LENGTH, sep='|'):
+    """
+    Join items with a separator, stopping before the result would exceed the column length.
+    """
+    parts = []
+    total = 0
+    for item in items:
+        item = str(item)
+        total += len(item) + (len(sep) if parts else 0)
+        if total > limit:
+            # Keep the truncated head of the first item rather than writing nothing
+            if not parts:
+                parts.append(item[:limit])
+            break
+        parts.append(item)
+    return sep.join(parts)
+
+# Fallback content used when no detailed explanation can be generated
+_DEFAULT_RESPONSE = MappingProxyType({
+    "simple_explanation": "We couldn't find detailed information about this medical term. Medical conditions can be complex and unique.",
+    "signs": (
+        "Limited information available",
+        "Recommend consulting a healthcare professional"
+    ),
+    "care_tips": (
+        "Verify the spelling of the medical term",
+        "Consult with a healthcare professional for accurate information"
+    ),
+    "when_to_consult": "Always seek professional medical advice for health concerns",
+    "conversational_tone": (
+        "Medical information can be nuanced and specific.",
+        "Professional guidance is crucial for understanding health conditions."
+    )
+})
+
+async def _queue_rows(rows, current_time):
+    """
+    Stamp rows with their query time (UTC datetime) and queue them for the background staging insert.
+    """
+    for row in rows:
+        row["Last_Queried"] = current_time  # Date_Added is set by BigQuery when the row is merged
+        await app.state.bq_queue.put(row)
+
+async def explain_medical_term(processed_term, pending_rows=None):
+    """
+    Generate a user-friendly explanation for one extracted term and queue its database update.
+    Batch callers pass a pending_rows list to collect the row instead, and queue all rows
+    with one timestamp once the whole batch is explained.
     """
     try:
-        # Extract medical term
-        processed_term = extract_medical_term(term)
-        
-        # Default fallback response structure
-        default_response = {
-            "term": processed_term,
-            "simple_explanation": "We couldn't find detailed information about this medical term. Medical conditions can be complex and unique.",
-            "signs": [
-                "Limited information available",
-                "Recommend consulting a healthcare professional"
-            ],
-            "care_tips": [
-                "Verify the spelling of the medical term",
-                "Consult with a healthcare professional for accurate information"
-            ],
-            "when_to_consult": "Always seek professional medical advice for health concerns",
-            "conversational_tone": [
-                "Medical information can be nuanced and specific.",
-                "Professional guidance is crucial for understanding health conditions."
-            ],
-            "database_update": False
-        }
-        
         # Fetch UMLS data
-        umls_data = fetch_umls_data(processed_term)
-        umls_definition = umls_data.get('definitions', [''])[0]
+        umls_data = await fetch_umls_data(processed_term)
+        umls_definition = (umls_data.get('definitions') or [''])[0]
         
         # Generate explanation using Gemini
-        improved_explanation = query_gemini(processed_term, umls_definition)
+        improved_explanation = await query_gemini(processed_term, umls_definition=umls_definition)
         
-        # Safely extract medical details
-        medical_details = improved_explanation.get('medical_details', default_response)
-        
-        # Construct medical explanation
-        medical_explanation = {
-            "term": processed_term,
-            "simple_explanation": medical_details.get('simple_explanation', default_response['simple_explanation']),
-            "signs": medical_details.get('signs_to_notice', default_response['signs']),
-            "care_tips": medical_details.get('care_advice', default_response['care_tips']),
-            "when_to_consult": medical_details.get('doctor_consultation_advice', default_response['when_to_consult']),
-            "conversational_tone": default_response['conversational_tone'],
-          
-        }
+        # Safely extract medical details, falling back to the defaults per field
+        medical_details = improved_explanation.get('medical_details') or _DEFAULT_RESPONSE
+        simple_explanation = medical_details.get('simple_explanation', _DEFAULT_RESPONSE['simple_explanation'])
+        signs = medical_details.get('signs_to_notice', _DEFAULT_RESPONSE['signs'])
+        care_tips = medical_details.get('care_advice', _DEFAULT_RESPONSE['care_tips'])
+        when_to_consult = medical_details.get('doctor_consultation_advice', _DEFAULT_RESPONSE['when_to_consult'])
         
         # Prepare data for database insertion
-        current_time = datetime.now().isoformat()
-        table_id = "useful-melody-444213-m6.tbird_resources.dbtable"
-        
-        # Prepare rows for upsert with comprehensive details
-        rows_to_upsert = [
-            {
-                "Term": processed_term,
-                "Simplified_Explanation": str(medical_explanation.get('simple_explanation', ''))[:500],
-                "Patient_Friendly_Explanation": str(medical_explanation.get('simple_explanation', ''))[:500],
-                "Care_Tips": '|'.join(str(tip) for tip in medical_explanation.get('care_tips', []))[:500],
-                "Symptoms": '|'.join(str(sign) for sign in medical_explanation.get('signs', []))[:500],
-                "When_To_Consult_Doctor": str(medical_explanation.get('when_to_consult', ''))[:500],
-                "Date_Added": current_time,
-                "Last_Queried": current_time,
-                "API_Tokens_Used": int(improved_explanation.get('total_tokens', 0)),
-                "UMLS_Definition": str(umls_definition)[:500]  # Include UMLS definition
-            }
-        ]
-        
-        # Perform database upsert operation
-        try:
-            merge_query = f"""
-            MERGE `{table_id}` T
-            USING UNNEST(@rows) S
-            ON T.Term = S.Term
-            WHEN MATCHED THEN
-                UPDATE SET 
-                    Simplified_Explanation = S.Simplified_Explanation,
-                    Patient_Friendly_Explanation = S.Patient_Friendly_Explanation,
-                    Care_Tips = S.Care_Tips,
-                    Symptoms = S.Symptoms,
-                    When_To_Consult_Doctor = S.When_To_Consult_Doctor,
-                    Last_Queried = S.Last_Queried,
-                    API_Tokens_Used = S.API_Tokens_Used,
-                    UMLS_Definition = S.UMLS_Definition
-            WHEN NOT MATCHED THEN
-                INSERT (
-                    Term, 
-                    Simplified_Explanation, 
-                    Patient_Friendly_Explanation, 
-                    Care_Tips, 
-                    Symptoms, 
-                    When_To_Consult_Doctor,
-                    Date_Added,
-                    Last_Queried,
-                    API_Tokens_Used,
-                    UMLS_Definition
-                )
-                VALUES (
-                    S.Term, 
-                    S.Simplified_Explanation, 
-                    S.Patient_Friendly_Explanation, 
-                    S.Care_Tips, 
-                    S.Symptoms, 
-                    S.When_To_Consult_Doctor,
-                    S.Date_Added,
-                    S.Last_Queried,
-                    S.API_Tokens_Used,
-                    S.UMLS_Definition
-                )
-            """
-            
-            job_config = bigquery.QueryJobConfig(
-                query_parameters=[
-                    bigquery.ArrayQueryParameter("rows", "STRUCT", rows_to_upsert)
-                ]
-            )
-            
-            # Execute the query
-            query_job = bq_client.query(merge_query, job_config=job_config)
-            query_job.result()  # Wait for the job to complete
-            
-            # Mark database update as successful
-            medical_explanation['database_update'] = True
-            
-        except Exception as db_error:
-            print(f"Database upsert error: {db_error}")
-            # Log the error but don't stop the process
+        clipped_explanation = _clip(simple_explanation)
+        row = {
+            "Term": processed_term,
+            "Simplified_Explanation": clipped_explanation,
+            "Patient_Friendly_Explanation": clipped_explanation,
+            "Care_Tips": _join_clip(care_tips),
+            "Symptoms": _join_clip(signs),
+            "When_To_Consult_Doctor": _clip(when_to_consult),
+            "API_Tokens_Used": int(improved_explanation.get('total_tokens', 0)),
+            "UMLS_Definition": _clip(umls_definition)  # Include UMLS definition
+        }
+
+        # Queue the row for the background staging insert; the write is reported optimistically
+        if pending_rows is None:
+            await _queue_rows([row], datetime.now(timezone.utc))
+        else:
+            pending_rows.append(row)
         
-        return medical_explanation
+        return {
+            "term": processed_term,
+            "simple_explanation": simple_explanation,
+            "signs": signs,
+            "care_tips": care_tips,
+            "when_to_consult": when_to_consult,
+            "conversational_tone": _DEFAULT_RESPONSE['conversational_tone'],
+            "database_update": True
+        }
     
     except Exception as e:
         # Log the error
-        print(f"Error in get_medical_explanation: {e}")
+        logger.error("Error in explain_medical_term: %s", e)
         
         # Return default response in case of any error
-        return default_response
+        return {"term": processed_term, **_DEFAULT_RESPONSE, "database_update": False}
+
+@app.get("/medical-explanation")
+async def get_medical_explanation(term: str):
+    """
+    Endpoint for generating user-friendly medical explanations.
+    Always generates a Gemini response and updates the database.
+    """
+    return await explain_medical_term(await extract_medical_term(term))
+
+@app.post("/medical-explanation/batch")
+async def get_medical_explanations_batch(batch: BatchTermInput):
+    """
+    Endpoint for explaining several medical terms in one request.
+    Terms are extracted in one spaCy batch, explained concurrently (Gemini calls share the
+    process-wide limit in gemini.py), and their rows are streamed in the same background insert.
+    """
+    processed_terms = await extract_medical_terms(batch.terms)
+    pending_rows = []
+    responses = await asyncio.gather(*(explain_medical_term(processed_term, pending_rows) for processed_term in processed_terms))
+
+    # Stamped once every term is explained, so no row's Last_Queried predates its enqueue time
+    await _queue_rows(pending_rows, datetime.now(timezone.utc))
+    return responses
  
 
+@app.get("/staging-merge")
+async def get_staging_merge():
+    """
+    Endpoint reporting the most recently submitted staging merge job, to be polled via /job-status.
+    """
+    return {
+        "job_id": app.state.merge_job_id,
+        "interval_seconds": STAGING_MERGE_INTERVAL_SECONDS
+    }
+
+@app.get("/job-status/{job_id}")
+async def get_job_status(job_id: str):
+    """
+    Endpoint for polling the state of a BigQuery job submitted by this API, such as a staging merge.
+    Jobs without the API's labels are reported as not found.
+    """
+    try:
+        job = await asyncio.to_thread(bq_client.get_job, job_id)
+    except NotFound:
+        job = None
+    if job is None or any(job.labels.get(key) != value for key, value in JOB_LABELS.items()):
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+    return {
+        "job_id": job.job_id,
+        "state": job.state,
+        "error": job.error_result
+    }
+
 @app.get("/performance-metrics")
-def get_performance_metrics(term: str):
+async def get_performance_metrics(term: str):
     try:
         # Measure start time
         start_time = time.time()
         
         # Fetch UMLS definition for term
-        umls_data = fetch_umls_data(term)
-        umls_definition = umls_data['definitions'][0] if umls_data['definitions'] else ''
+        umls_data = await fetch_umls_data(term)
+        umls_definition = (umls_data.get('definitions') or [''])[0]
 
         # Query Gemini and measure response time
-        gemini_response = query_gemini(term, umls_definition)
+        gemini_response = await query_gemini(term, umls_definition=umls_definition)
         end_time = time.time()
 
-        # Extract token count (Gemini's response includes token usage)
-        total_tokens_used = gemini_response.get('total_tokens', 0)
+        # Extract token count (Gemini's response includes token usage); cached responses cost this call nothing
+        total_tokens_used = 0 if gemini_response.get('cached') else gemini_response.get('total_tokens', 0)
 
         # Calculate response time
         response_time = end_time - start_time
@@ -235,19 +456,13 @@ def get_performance_metrics(term: str):
             "term": term,
             "response_time_seconds": round(response_time, 2),
             "total_tokens_used": total_tokens_used,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now(timezone.utc)  # orjson encodes datetimes as RFC 3339
         }
 
     except Exception as e:
-        print(f"Error in /performance-metrics for term '{term}': {e}")
+        logger.error("Error in /performance-metrics for term '%s': %s", term, e)
         return {
             "status": "error",
             "message": "Could not retrieve performance metrics.",
             "details": str(e)
         }
-
-
-    # Run the query
-    query_job = bq_client.query(merge_query, job_config=job_config)
-    query_job.result()  # Wait for the job to complete
-
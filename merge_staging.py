@@ -0,0 +1,122 @@
+from google.cloud import bigquery
+from datetime import datetime, timedelta, timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+TABLE_ID = 'useful-melody-444213-m6.tbird_resources.dbtable'
+STAGING_TABLE_ID = 'useful-melody-444213-m6.tbird_resources.dbtable_stage'
+
+# Jobs scanning more than this fail instead of being billed (1 GB)
+MAXIMUM_BYTES_BILLED = 10**9
+# Labels attached to API-issued jobs, for filtering them in billing and job history
+JOB_LABELS = {'source': 'api'}
+
+# The staging table is partitioned by day on Last_Queried so merges only scan recent
+# partitions; staged rows are dropped once their partition is older than this
+STAGING_PARTITION_EXPIRATION = timedelta(days=7)
+
+# Latest staged row per term is merged into the main table. Rows that are not newer
+# than the stored Last_Queried are skipped, so re-running over already merged rows is a no-op.
+# @since limits the staging scan to recent partitions of the staging table.
+# Date_Added is not staged; new terms are stamped with CURRENT_TIMESTAMP() when inserted.
+MERGE_QUERY = f"""
+    MERGE `{TABLE_ID}` T
+    USING (
+        SELECT *
+        FROM `{STAGING_TABLE_ID}`
+        WHERE Last_Queried >= @since
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY Term ORDER BY Last_Queried DESC) = 1
+    ) S
+    ON T.Term = S.Term
+    WHEN MATCHED AND (T.Last_Queried IS NULL OR S.Last_Queried > T.Last_Queried) THEN
+        UPDATE SET 
+            Simplified_Explanation = S.Simplified_Explanation,
+            Patient_Friendly_Explanation = S.Patient_Friendly_Explanation,
+            Care_Tips = S.Care_Tips,
+            Symptoms = S.Symptoms,
+            When_To_Consult_Doctor = S.When_To_Consult_Doctor,
+            Last_Queried = S.Last_Queried,
+            API_Tokens_Used = S.API_Tokens_Used,
+            UMLS_Definition = S.UMLS_Definition
+    WHEN NOT MATCHED THEN
+        INSERT (
+            Term, 
+            Simplified_Explanation, 
+            Patient_Friendly_Explanation, 
+            Care_Tips, 
+            Symptoms, 
+            When_To_Consult_Doctor,
+            Date_Added,
+            Last_Queried,
+            API_Tokens_Used,
+            UMLS_Definition
+        )
+        VALUES (
+            S.Term, 
+            S.Simplified_Explanation, 
+            S.Patient_Friendly_Explanation, 
+            S.Care_Tips, 
+            S.Symptoms, 
+            S.When_To_Consult_Doctor,
+            CURRENT_TIMESTAMP(),
+            S.Last_Queried,
+            S.API_Tokens_Used,
+            S.UMLS_Definition
+        )
+"""
+
+def ensure_staging_table(client):
+    """
+    Create the staging table with the main table's schema if it does not exist yet,
+    partitioned by day on Last_Queried with expiring partitions.
+    """
+    staging_table = bigquery.Table(STAGING_TABLE_ID, schema=client.get_table(TABLE_ID).schema)
+    staging_table.time_partitioning = bigquery.TimePartitioning(
+        type_=bigquery.TimePartitioningType.DAY,
+        field="Last_Queried",
+        expiration_ms=int(STAGING_PARTITION_EXPIRATION.total_seconds() * 1000)
+    )
+    staging_table = client.create_table(staging_table, exists_ok=True)
+
+    # Partitioning cannot be added to an existing table; without it every merge scans all staged rows
+    if staging_table.time_partitioning is None:
+        logger.warning("%s is not partitioned; drop it once merged so it is recreated with partitioning", STAGING_TABLE_ID)
+
+def submit_staging_merge(client, since=None):
+    """
+    Start the staging MERGE job and return it without waiting for it to finish.
+    Only staged rows queried at or after `since` are considered; without it,
+    every partition that has not expired yet is merged.
+    """
+    if since is None:
+        since = datetime.now(timezone.utc) - STAGING_PARTITION_EXPIRATION
+
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("since", "TIMESTAMP", since)
+        ],
+        use_query_cache=True,
+        maximum_bytes_billed=MAXIMUM_BYTES_BILLED,
+        labels=JOB_LABELS,
+        priority=bigquery.QueryPriority.INTERACTIVE
+    )
+    return client.query(MERGE_QUERY, job_config=job_config)
+
+def merge_staging_into_main(client, since=None):
+    """
+    Deduplicate staged explanation rows into the main table with a single MERGE.
+    Returns the number of rows inserted or updated.
+    """
+    query_job = submit_staging_merge(client, since)
+    query_job.result()  # Wait for the job to complete
+    return query_job.num_dml_affected_rows
+
+if __name__ == "__main__":
+    # Shared BigQuery client, only built when run as a script
+    from gcp_clients import bq_client as client
+
+    # Meant to be run on a schedule (cron or Cloud Scheduler) when the API's in-process merge is disabled
+    ensure_staging_table(client)
+    affected_rows = merge_staging_into_main(client)
+    print(f"Merged staged rows into {TABLE_ID} ({affected_rows} rows affected).")
@@ -1,23 +1,5 @@
 from google.cloud import bigquery
-from google.oauth2 import service_account
-import os
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv('key.env')
-
-# Service Account Setup
-SERVICE_ACCOUNT_FILE = os.getenv('SERVICE_ACCOUNT_FILE')
-credentials = service_account.Credentials.from_service_account_file(
-    SERVICE_ACCOUNT_FILE, 
-    scopes=["https://www.googleapis.com/auth/bigquery"]
-)
-
-# Initialize BigQuery client
-client = bigquery.Client(
-    credentials=credentials, 
-    project='useful-melody-444213-m6'
-)
+from gcp_clients import bq_client as client
 
 def update_medical_terms_schema():
     # Get the current table
@@ -41,5 +23,6 @@ def update_medical_terms_schema():
 
     print("Table schema updated successfully.")
 
-# Run the update
-update_medical_terms_schema()
\ No newline at end of file
+# Run the update only when executed as a script, never on import
+if __name__ == "__main__":
+    update_medical_terms_schema()